@@ -1,29 +1,102 @@
 # main.py
+import asyncio
+import copy
+import json
 import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 import joblib
+import numpy as np
 import pandas as pd
-from typing import Optional, Dict, Any, List
+from scipy import sparse
+from typing import Optional, Dict, Any, List, NamedTuple
 
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from pydantic import BaseModel
 
-from sklearn.ensemble import RandomForestRegressor
+from sklearn.ensemble import HistGradientBoostingRegressor
 from sklearn.pipeline import Pipeline
 from sklearn.compose import ColumnTransformer
-from sklearn.preprocessing import OneHotEncoder, StandardScaler
+from sklearn.preprocessing import OneHotEncoder
 from sklearn.impute import SimpleImputer
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import mean_absolute_error
+from threadpoolctl import ThreadpoolController
+
+# fcntl is POSIX-only; without it training is only serialized within one process
+try:
+    import fcntl
+except ImportError as e:
+    print("Warning: fcntl unavailable, training is only serialized within one worker:", e)
+    fcntl = None
+
+# Optional multi-threaded CSV reader; load_csv falls back to pandas' own parser
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pcsv
+except ImportError as e:
+    print("Warning: pyarrow unavailable, reading CSVs with pandas:", e)
+    pa = None
+    pcsv = None
+
+# Optional fast inference runtime; we fall back to sklearn's predict when missing
+try:
+    import onnxruntime as ort
+    from skl2onnx import convert_sklearn
+    from skl2onnx.common.data_types import FloatTensorType, StringTensorType
+except ImportError as e:
+    print("Warning: onnxruntime/skl2onnx unavailable, using sklearn predict:", e)
+    ort = None
+    convert_sklearn = None
+    FloatTensorType = None
+    StringTensorType = None
+
+# Optional AOT compilation of the fitted trees into a shared library (needs a C toolchain)
+try:
+    import treelite
+    import treelite.sklearn
+    import tl2cgen
+except ImportError as e:
+    print("Warning: treelite/tl2cgen unavailable, model will not be compiled:", e)
+    treelite = None
+    tl2cgen = None
 
 # --------------------------
 # Config
 # --------------------------
 CSV_PATH = "Data_1.csv"            # put your CSV in same directory or change this path
 MODEL_PATH = "investment_model.pkl"
-PIPELINE_PATH = "preprocessor_pipeline.pkl"
+ONNX_MODEL_PATH = "investment_model.onnx"
+COMPILED_MODEL_PATH = "investment_model.so"
+PIPELINE_PATH = "preprocessor_pipeline.pkl"  # written last, so its mtime marks a complete model
+TRAIN_LOCK_PATH = "train.lock"    # flock'd for a whole /train run, so only one worker trains at a time
+ARTIFACT_LOCK_PATH = "artifacts.lock"  # exclusive while artifacts are written, shared while loading
+TRAIN_JOBS_DIR = "train_jobs"     # one status file per /train job, so every worker can answer /train/status
+MODEL_RELOAD_INTERVAL = 2.0       # seconds between checks for a model trained by another worker
 TARGET_COL = "5yr_Return"         # change if your target column has a different name
 RANDOM_STATE = 42
+TRAIN_MAE_SAMPLES = 10000         # train MAE is estimated on at most this many training rows
+# predict latency scales with the number of trees: start compact and only grow the ensemble
+# to MAX_ITER if the extra trees improve validation MAE by more than MIN_MAE_GAIN
+COMPACT_MAX_ITER = 100
+MAX_ITER = 300
+MIN_MAE_GAIN = 0.02
+PREDICT_COALESCE_WINDOW = 100e-6  # seconds concurrent /predict calls wait to be batched together
+PREDICT_MAX_BATCH = 256
+ONNX_CHECK_ROWS = 200             # validation rows the exported ONNX graph must reproduce sklearn on
+MAX_TRAIN_JOBS = 100              # job status files kept for /train/status, oldest finished dropped first
+TRAIN_JOB_STALE_AFTER = 6 * 3600  # seconds a job may sit pending/running before it counts as abandoned
+# the recommendations cache only needs these columns; categorical risk keeps filtering cheap
+RECOMMENDATION_COLS = ["Investment_Name", "Risk_Level", TARGET_COL]
+# returns stay float64: they are echoed back in the JSON, where float32 would print as 7.119999885559082
+RECOMMENDATION_DTYPES = {"Risk_Level": "category", TARGET_COL: "float64"}
 
 # --------------------------
 # FastAPI app + CORS
@@ -37,14 +110,21 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(GZipMiddleware, minimum_size=500)
 
 # --------------------------
 # Pydantic request/response models
 # --------------------------
-class TrainResponse(BaseModel):
-    message: str
-    train_mae: float
-    val_mae: float
+class TrainJobResponse(BaseModel):
+    job_id: str
+    status: str
+
+class TrainStatusResponse(BaseModel):
+    job_id: str
+    status: str  # pending / running / completed / failed
+    message: Optional[str] = None
+    train_mae: Optional[float] = None
+    val_mae: Optional[float] = None
 
 class PredictRequest(BaseModel):
     features: Dict[str, Any]  # feature name -> value
@@ -52,6 +132,12 @@ class PredictRequest(BaseModel):
 class PredictResponse(BaseModel):
     predicted_5yr_return: float
 
+class PredictBatchRequest(BaseModel):
+    features: List[Dict[str, Any]]  # one feature dict per sample
+
+class PredictBatchResponse(BaseModel):
+    predicted_5yr_returns: List[float]
+
 class ChatRequest(BaseModel):
     message: str
     risk: Optional[str] = None
@@ -70,11 +156,69 @@ class RecommendationsResponse(BaseModel):
 # --------------------------
 # Utilities: load CSV, detect cols
 # --------------------------
-def load_csv(path: str) -> pd.DataFrame:
+# pandas dtype names load_csv knows how to hand to the arrow reader
+_ARROW_DTYPES = {
+    "category": lambda: pa.dictionary(pa.int32(), pa.string()),
+    "float32": lambda: pa.float32(),
+    "float64": lambda: pa.float64(),
+    "int64": lambda: pa.int64(),
+    "str": lambda: pa.string(),
+}
+
+def _read_csv_arrow(path: str, usecols: Optional[List[str]], dtypes: Optional[Dict[str, str]]) -> Optional[pd.DataFrame]:
+    # pyarrow parses blocks in parallel; returns None when the file or dtypes need pandas instead
+    dtypes = dtypes or {}
+    if any(d not in _ARROW_DTYPES for d in dtypes.values()):
+        return None
+    read_options = pcsv.ReadOptions(use_threads=True, block_size=1 << 22)
+    # peek at the header and the types inferred from the first block
+    with pcsv.open_csv(path, read_options=read_options) as reader:
+        schema = reader.schema
+    wanted = set(usecols) if usecols is not None else None
+    include, column_types = [], {}
+    for field in schema:
+        name = field.name.strip()
+        if wanted is not None and name not in wanted:
+            continue
+        include.append(field.name)
+        if name in dtypes:
+            column_types[field.name] = _ARROW_DTYPES[dtypes[name]]()
+        elif pa.types.is_temporal(field.type):
+            # pandas leaves dates/times as strings; keep feature values identical to it
+            column_types[field.name] = pa.string()
+    if not include:
+        # an empty include_columns would mean "all columns" to pyarrow
+        return pd.DataFrame()
+    convert_options = pcsv.ConvertOptions(include_columns=include, column_types=column_types,
+                                          strings_can_be_null=True)
+    try:
+        table = pcsv.read_csv(path, read_options=read_options, convert_options=convert_options)
+    except pa.ArrowInvalid:
+        # e.g. a column inferred as int from the first block holds floats further down
+        return None
+    df = table.to_pandas(split_blocks=True, self_destruct=True)
+    # arrow nulls in string columns come out as None where pandas' parser gives NaN, and
+    # SimpleImputer(missing_values=np.nan) would keep None as a category of its own
+    for col in df.columns[df.dtypes == object]:
+        df[col] = df[col].where(df[col].notna(), np.nan)
+    return df
+
+def load_csv(path: str, usecols: Optional[List[str]] = None, dtypes: Optional[Dict[str, str]] = None) -> pd.DataFrame:
     if not os.path.exists(path):
         raise FileNotFoundError(f"CSV file '{path}' not found. Put it in the project directory.")
-    df = pd.read_csv(path)
+    df = _read_csv_arrow(path, usecols, dtypes) if pcsv is not None else None
+    if df is not None:
+        df.columns = df.columns.str.strip()
+        return df
+    if usecols is not None:
+        # match on stripped header names and tolerate columns the file doesn't have
+        wanted = set(usecols)
+        usecols = lambda c: c.strip() in wanted
+    df = pd.read_csv(path, usecols=usecols)
     df.columns = df.columns.str.strip()
+    if dtypes:
+        # dtypes are keyed on stripped names, like usecols (and the arrow path)
+        df = df.astype({col: dtype for col, dtype in dtypes.items() if col in df.columns})
     return df
 
 def create_preprocessing_pipeline(df: pd.DataFrame, target_col: str):
@@ -83,174 +227,856 @@ def create_preprocessing_pipeline(df: pd.DataFrame, target_col: str):
     # infer numeric vs categorical
     numeric_cols = df[feature_cols].select_dtypes(include=["int64", "float64"]).columns.tolist()
     categorical_cols = [c for c in feature_cols if c not in numeric_cols]
-    # Build transformers
-    numeric_transformer = Pipeline(steps=[
-        ("imputer", SimpleImputer(strategy="median")),
-        ("scaler", StandardScaler())
-    ])
+    # Build transformers. Numeric columns pass through untouched: trees are invariant to
+    # scaling and HistGradientBoosting handles NaN natively, so no scaler or imputer.
+    numeric_transformer = "passthrough"
     categorical_transformer = Pipeline(steps=[
         ("imputer", SimpleImputer(strategy="constant", fill_value="missing")),
-        ("onehot", OneHotEncoder(handle_unknown="ignore", sparse=False))
+        # one-hot stays sparse until ColumnTransformer stacks the final matrix
+        ("onehot", OneHotEncoder(handle_unknown="ignore", sparse_output=True))
     ])
     preprocessor = ColumnTransformer(transformers=[
         ("num", numeric_transformer, numeric_cols),
         ("cat", categorical_transformer, categorical_cols)
-    ], remainder="drop")
+    ], remainder="drop", sparse_threshold=0.0)  # HistGradientBoosting needs dense input
     return preprocessor, feature_cols, numeric_cols, categorical_cols
 
+def category_key(value: Any, fill_value: Any) -> str:
+    # how a raw categorical value is matched against the fitted categories on every backend:
+    # missing -> the imputer's fill value, anything else by its string form (all the ONNX
+    # graph's string inputs can carry), so {"Cat": 5} matches category "5" everywhere
+    if value is None or (isinstance(value, float) and np.isnan(value)):
+        return str(fill_value)
+    return str(value)
+
+class RowEncoder:
+    """
+    Encode feature dicts exactly like the fitted ColumnTransformer from
+    create_preprocessing_pipeline, but straight into numpy rows (no DataFrame round-trip).
+    encode() returns a per-thread buffer reused across calls: consume it (or copy it) before
+    the same thread encodes again. encode_many() returns a fresh matrix.
+    """
+    def __init__(self, n_features: int, numeric: List[tuple], categorical: List[tuple]):
+        self.n_features = n_features
+        self.numeric = numeric          # [(column, output position)]
+        self.categorical = categorical  # [(column, {str(category): output position}, fill value)]
+        self._local = threading.local()
+
+    def encode(self, features: Dict[str, Any]) -> np.ndarray:
+        row = getattr(self._local, "row", None)
+        if row is None:
+            # float64: HistGradientBoosting and treelite both predict on float64 input
+            row = self._local.row = np.zeros((1, self.n_features), dtype=np.float64)
+        else:
+            row.fill(0)
+        self._write(row[0], features)
+        return row
+
+    def encode_many(self, features_list: List[Dict[str, Any]]) -> np.ndarray:
+        X = np.zeros((len(features_list), self.n_features), dtype=np.float64)
+        for i, features in enumerate(features_list):
+            self._write(X[i], features)
+        return X
+
+    def _write(self, row: np.ndarray, features: Dict[str, Any]) -> None:
+        # `row` is a zeroed 1-d view into the output
+        for col, pos in self.numeric:
+            value = features.get(col)
+            row[pos] = np.nan if value is None else float(value)
+        for col, positions, fill in self.categorical:
+            pos = positions.get(category_key(features.get(col), fill))
+            if pos is not None:  # unknown categories stay all-zero (handle_unknown="ignore")
+                row[pos] = 1.0
+
+def build_row_encoder(prep) -> Optional[RowEncoder]:
+    # only the layout built by create_preprocessing_pipeline is supported; anything else
+    # (e.g. pipelines pickled by older versions) keeps going through preprocessor.transform
+    if not isinstance(prep, ColumnTransformer) or not hasattr(prep, "output_indices_"):
+        return None
+    numeric, categorical = [], []
+    for name, trans, cols in prep.transformers_:
+        if trans == "drop" or len(cols) == 0:
+            continue
+        start = prep.output_indices_[name].start
+        if trans == "passthrough":
+            numeric.extend((col, start + i) for i, col in enumerate(cols))
+            continue
+        steps = dict(trans.steps) if isinstance(trans, Pipeline) else {}
+        imputer, ohe = steps.get("imputer"), steps.get("onehot")
+        if (len(steps) != 2 or not isinstance(imputer, SimpleImputer) or imputer.strategy != "constant"
+                or not isinstance(ohe, OneHotEncoder) or ohe.drop_idx_ is not None
+                or getattr(ohe, "_infrequent_enabled", False)):
+            return None
+        for col, cats in zip(cols, ohe.categories_):
+            categorical.append((col, {str(cat): start + i for i, cat in enumerate(cats)}, imputer.fill_value))
+            start += len(cats)
+    n_features = max((sl.stop for sl in prep.output_indices_.values()), default=0)
+    return RowEncoder(n_features, numeric, categorical)
+
+# process umask, read once (os.umask can only be queried by setting it)
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def _temp_path_for(path: str) -> str:
+    # unique (hidden) file next to `path` so os.replace() stays on the same filesystem
+    fd, tmp_path = tempfile.mkstemp(prefix=".", suffix=os.path.splitext(path)[1],
+                                    dir=os.path.dirname(os.path.abspath(path)))
+    os.close(fd)
+    # mkstemp creates 0600 and os.replace keeps it; give artifacts the mode a plain open() would
+    os.chmod(tmp_path, 0o666 & ~_UMASK)
+    return tmp_path
+
+def atomic_dump(obj, path: str) -> None:
+    # other workers may be loading `path`; never let them see a half-written file
+    tmp_path = _temp_path_for(path)
+    try:
+        joblib.dump(obj, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def atomic_write(data: bytes, path: str) -> None:
+    # atomic_dump for raw bytes
+    tmp_path = _temp_path_for(path)
+    try:
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+def onnx_input_columns(prep) -> Optional[tuple]:
+    # (numeric columns, categorical columns, categorical fill value) the fused ONNX graph takes
+    # as inputs, or None for a preprocessor layout not built by create_preprocessing_pipeline
+    if not isinstance(prep, ColumnTransformer) or not hasattr(prep, "transformers_"):
+        return None
+    numeric, categorical, fill = [], [], "missing"
+    for name, trans, cols in prep.transformers_:
+        if trans == "drop" or len(cols) == 0:
+            continue
+        if trans == "passthrough":
+            numeric.extend(cols)
+        elif isinstance(trans, Pipeline) and isinstance(trans.named_steps.get("imputer"), SimpleImputer):
+            categorical.extend(cols)
+            fill = trans.named_steps["imputer"].fill_value
+        else:
+            return None
+    return numeric, categorical, fill
+
+class FusedOnnxModel:
+    """
+    onnxruntime session over the whole preprocessor + model pipeline: raw feature values go
+    in as one input per column and the prediction comes out, with no sklearn transform step.
+    """
+    def __init__(self, session, numeric: List[str], categorical: List[str], fill_value: str):
+        self.session = session
+        self.numeric = numeric
+        self.categorical = categorical
+        self.fill_value = fill_value
+
+    def predict(self, features_list: List[Dict[str, Any]]) -> np.ndarray:
+        inputs = {}
+        for col in self.numeric:
+            values = [f.get(col) for f in features_list]
+            inputs[col] = np.array([[np.nan if v is None else float(v)] for v in values], dtype=np.float32)
+        for col in self.categorical:
+            # string tensors can't hold NaN, so apply the imputer's fill value here
+            inputs[col] = np.array([[category_key(f.get(col), self.fill_value)] for f in features_list], dtype=object)
+        return self.session.run(None, inputs)[0].reshape(-1)
+
+def _onnx_convertible(prep):
+    # skl2onnx rejects a SimpleImputer with a string fill_value and chokes on transformers over
+    # no columns. FusedOnnxModel.predict already applies the fill value, so convert a shallow
+    # copy with the categorical imputers taken out and the empty transformers dropped.
+    conv = copy.copy(prep)
+    transformers = []
+    for name, trans, cols in prep.transformers_:
+        if trans == "drop" or len(cols) == 0:
+            continue
+        if isinstance(trans, Pipeline):
+            steps = [(n, step) for n, step in trans.steps if n != "imputer"]
+            trans = steps[0][1] if len(steps) == 1 else Pipeline(steps)
+        transformers.append((name, trans, cols))
+    conv.transformers_ = transformers
+    return conv
+
+def export_onnx_model(prep, mdl, path: str) -> bool:
+    # fuse preprocessor + regressor into one ONNX graph so /predict is a single onnxruntime call
+    columns = onnx_input_columns(prep)
+    if convert_sklearn is None or columns is None:
+        return False
+    numeric, categorical, _ = columns
+    initial_types = [(col, FloatTensorType([None, 1])) for col in numeric]
+    initial_types += [(col, StringTensorType([None, 1])) for col in categorical]
+    onx = convert_sklearn(Pipeline([("prep", _onnx_convertible(prep)), ("model", mdl)]), initial_types=initial_types)
+    atomic_write(onx.SerializeToString(), path)
+    return True
+
+def check_onnx_model(fused: FusedOnnxModel, prep, mdl, X: pd.DataFrame) -> None:
+    # the graph is built by hand-editing the pipeline, so refuse to serve it unless it
+    # reproduces sklearn on real rows (onnxruntime's trees run in float32, hence the tolerance)
+    expected = mdl.predict(prep.transform(X))
+    got = fused.predict(X.to_dict("records"))
+    if not np.allclose(got, expected, rtol=1e-3, atol=1e-3):
+        raise ValueError(f"ONNX predictions differ from sklearn by up to {np.max(np.abs(got - expected)):.4g}")
+
+def load_onnx_model(path: str, prep) -> Optional[FusedOnnxModel]:
+    columns = onnx_input_columns(prep)
+    if ort is None or columns is None or not os.path.exists(path):
+        return None
+    sess_options = ort.SessionOptions()
+    # single-row request/response workload: extra threads only add sync overhead
+    sess_options.intra_op_num_threads = 1
+    session = ort.InferenceSession(path, sess_options=sess_options, providers=["CPUExecutionProvider"])
+    numeric, categorical, fill = columns
+    if {i.name for i in session.get_inputs()} != set(numeric) | set(categorical):
+        # a model-only graph from an older version, or one that doesn't match this pipeline
+        return None
+    return FusedOnnxModel(session, numeric, categorical, fill)
+
+def compile_model(mdl, path: str):
+    """
+    Compile the fitted trees to C with treelite/tl2cgen and load the resulting library.
+    The build goes to a unique temp file which is then renamed over `path`: a library that
+    is already loaded keeps its mapping, and the dynamic loader never sees a reused name.
+    """
+    if tl2cgen is None:
+        return None
+    tl_model = treelite.sklearn.import_model(mdl)
+    tmp_path = _temp_path_for(path)
+    try:
+        tl2cgen.export_lib(tl_model, toolchain="gcc", libpath=tmp_path, params={"parallel_comp": 32})
+        predictor = tl2cgen.Predictor(tmp_path, nthread=1)
+        os.replace(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+    return predictor
+
+def load_compiled_model(path: str):
+    if tl2cgen is None or not os.path.exists(path):
+        return None
+    # load through a private copy: the dynamic loader hands back an already-loaded library
+    # when it sees the same path again, which would pin a hot-reloaded worker to the old model
+    tmp_path = _temp_path_for(path)
+    try:
+        shutil.copyfile(path, tmp_path)
+        return tl2cgen.Predictor(tmp_path, nthread=1)
+    finally:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass  # Windows can't unlink a loaded DLL; leave it behind
+
+# HistGradientBoosting fits and predicts with OpenMP on every core; that is what we want for
+# /train, but for a single row the thread fan-out costs more than walking the trees
+_THREADPOOLS = ThreadpoolController()
+
+class ServingModel(NamedTuple):
+    """
+    Everything /predict needs from one trained pipeline. It is only ever replaced as a whole,
+    so a request that takes one reference to it never pairs an encoder with another model.
+    """
+    model: Any
+    preprocessor: Any
+    feature_columns: Optional[List[str]]
+    onnx_model: Optional[FusedOnnxModel]
+    compiled_model: Any
+    row_encoder: Optional[RowEncoder]
+    mtime: Optional[float]  # mtime of the PIPELINE_PATH it was loaded from
+
+    def available(self) -> bool:
+        return self.compiled_model is not None or self.onnx_model is not None or self.model is not None
+
+def predict_rows(serving: ServingModel, X) -> np.ndarray:
+    # transformed rows in, predictions out: compiled library if loaded, else sklearn
+    # (the ONNX model takes raw features instead, see _predict_core)
+    if serving.compiled_model is not None:
+        if sparse.issparse(X):
+            X = X.toarray()
+        # treelite imports sklearn thresholds as float64
+        dmat = tl2cgen.DMatrix(X, dtype="float64")
+        return np.asarray(serving.compiled_model.predict(dmat)).reshape(-1)
+    if X.shape[0] == 1:
+        with _THREADPOOLS.limit(limits=1, user_api="openmp"):
+            return serving.model.predict(X)
+    return serving.model.predict(X)
+
 # --------------------------
 # Model load at startup (if exists)
 # --------------------------
-model = None
-preprocessor = None
-feature_columns = None
+_SERVING: Optional[ServingModel] = None
+_MODEL_CHECKED_AT = 0.0
+# serializes the threads that replace _SERVING (startup/hot reload and /train)
+_TRAIN_LOCK = threading.Lock()
+
+def current_model() -> Optional[ServingModel]:
+    """
+    The model to serve this request with, after picking up one trained by another worker.
+    Callers keep the returned reference for the whole request.
+    """
+    maybe_reload_model()
+    serving = _SERVING
+    return serving if serving is not None and serving.available() else None
+
+@contextmanager
+def file_lock(path: str, exclusive: bool, blocking: bool = False):
+    """
+    flock on `path`, shared across uvicorn workers; yields whether it was acquired (always
+    True when blocking). Used with TRAIN_LOCK_PATH and ARTIFACT_LOCK_PATH.
+    """
+    if fcntl is None:
+        yield True
+        return
+    flags = fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH
+    if not blocking:
+        flags |= fcntl.LOCK_NB
+    with open(path, "a") as f:
+        try:
+            fcntl.flock(f, flags)
+            acquired = True
+        except BlockingIOError:
+            acquired = False
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def load_model_artifacts() -> bool:
+    """
+    (Re)load the pipeline and the fastest available model artifact from disk into _SERVING.
+    Returns False if another worker is writing artifacts right now (try again later).
+    """
+    global _SERVING
+
+    with file_lock(ARTIFACT_LOCK_PATH, exclusive=False) as acquired:
+        if not acquired or not os.path.exists(PIPELINE_PATH):
+            return False
+        mtime = os.path.getmtime(PIPELINE_PATH)
+        new_model, prep, cols, fused, predictor, encoder = None, None, None, None, None, None
+        try:
+            wrapper = joblib.load(PIPELINE_PATH)
+            if isinstance(wrapper, dict):
+                prep = wrapper["preprocessor"]
+                cols = wrapper.get("feature_columns", None)
+            else:
+                prep = wrapper
+            # feature_columns saved inside pipeline metadata if available, else leave None
+            if cols is None and hasattr(prep, "feature_names_in_"):
+                cols = list(prep.feature_names_in_)
+            encoder = build_row_encoder(prep)
+        except Exception as e:
+            print("Warning: failed to load existing pipeline:", e)
+            prep, cols, encoder = None, None, None
+
+        if prep is not None:
+            # prefer the flat serving artifacts: they load in milliseconds, while unpickling the
+            # sklearn estimator rebuilds its whole object graph
+            try:
+                predictor = load_compiled_model(COMPILED_MODEL_PATH)
+            except Exception as e:
+                print("Warning: failed to load compiled model:", e)
+                predictor = None
+            if predictor is None:
+                try:
+                    fused = load_onnx_model(ONNX_MODEL_PATH, prep)
+                except Exception as e:
+                    print("Warning: failed to load ONNX model, using sklearn predict:", e)
+                    fused = None
+            if predictor is None and fused is None and os.path.exists(MODEL_PATH):
+                try:
+                    new_model = joblib.load(MODEL_PATH)
+                except Exception as e:
+                    print("Warning: failed to load existing model:", e)
+                    new_model = None
+
+    with _TRAIN_LOCK:
+        _SERVING = ServingModel(new_model, prep, cols, fused, predictor, encoder, mtime)
+    return True
+
+def maybe_reload_model() -> None:
+    # with several uvicorn workers, /train runs in just one of them; the others notice the new
+    # pipeline file here (checked at most every MODEL_RELOAD_INTERVAL seconds) and reload
+    global _MODEL_CHECKED_AT
+    now = time.monotonic()
+    if now - _MODEL_CHECKED_AT < MODEL_RELOAD_INTERVAL:
+        return
+    _MODEL_CHECKED_AT = now
+    try:
+        mtime = os.path.getmtime(PIPELINE_PATH)
+    except OSError:
+        return
+    serving = _SERVING
+    if serving is None or mtime != serving.mtime:
+        load_model_artifacts()
+
+@app.on_event("startup")
+def load_model_on_startup():
+    load_model_artifacts()
+
+# --------------------------
+# CSV cache (read once, reloaded only if the file changes on disk)
+# --------------------------
+class CsvCache(NamedTuple):
+    """One load of the CSV and everything derived from it, replaced as a whole on reload."""
+    df: pd.DataFrame
+    # normalized Risk_Level as integer codes (-1 for missing) plus the name -> code mapping
+    risk_codes: Optional[np.ndarray]
+    risk_code_map: Dict[str, int]
+    mtime: float
+    # normalized risk -> top 3 items; relaxed (substring) matches are memoized on first use
+    top_by_risk: Dict[str, List[dict]]
+    top_by_contains: Dict[str, List[dict]]
 
-if os.path.exists(MODEL_PATH) and os.path.exists(PIPELINE_PATH):
+_CSV_CACHE: Optional[CsvCache] = None
+
+def top_items(df: pd.DataFrame, n: int = 3) -> List[dict]:
+    items = []
+    for _, r in df.head(n).iterrows():
+        items.append({
+            "Investment_Name": r.get("Investment_Name", "Unknown"),
+            "Risk_Level": r.get("Risk_Level"),
+            "FiveYearReturn": r.get(TARGET_COL) if TARGET_COL in r.index else None
+        })
+    return items
+
+def refresh_csv_cache(force: bool = False) -> Optional[CsvCache]:
+    # returns the cache to answer this request from (None if the CSV is missing)
+    global _CSV_CACHE
+    try:
+        mtime = os.path.getmtime(CSV_PATH)
+    except OSError:
+        _CSV_CACHE = None
+        return None
+    cache = _CSV_CACHE
+    if not force and cache is not None and mtime == cache.mtime:
+        return cache
+    df = load_csv(CSV_PATH, usecols=RECOMMENDATION_COLS, dtypes=RECOMMENDATION_DTYPES)
+    # pre-sort by return so a risk-filtered slice only needs .head(3)
+    if TARGET_COL in df.columns:
+        df = df.sort_values(by=TARGET_COL, ascending=False).reset_index(drop=True)
+    risk_codes, risk_code_map = None, {}
+    top_by_risk = {}
+    if "Risk_Level" in df.columns:
+        levels = df["Risk_Level"].astype("category")
+        # normalize the handful of distinct categories instead of every row
+        cats = levels.cat.categories
+        risk_norm = pd.Categorical(levels.map(dict(zip(cats, cats.astype(str).str.strip().str.lower()))))
+        risk_codes = np.asarray(risk_norm.codes)
+        risk_code_map = {name: code for code, name in enumerate(risk_norm.categories)}
+        # groupby keeps row order inside each group, so the head is already the top by return
+        for code, group in df.groupby(risk_codes, sort=False):
+            if code >= 0:
+                top_by_risk[risk_norm.categories[code]] = top_items(group)
+    cache = _CSV_CACHE = CsvCache(df, risk_codes, risk_code_map, mtime, top_by_risk, {})
+    return cache
+
+@app.on_event("startup")
+def load_csv_cache():
     try:
-        model = joblib.load(MODEL_PATH)
-        preprocessor = joblib.load(PIPELINE_PATH)
-        # feature_columns saved inside pipeline metadata if available, else leave None
-        if hasattr(preprocessor, "feature_names_in_"):
-            feature_columns = list(preprocessor.feature_names_in_)
+        refresh_csv_cache(force=True)
     except Exception as e:
-        print("Warning: failed to load existing model/pipeline:", e)
-        model = None
-        preprocessor = None
-        feature_columns = None
+        print("Warning: failed to load CSV cache:", e)
 
 # --------------------------
 # Endpoints
 # --------------------------
 @app.get("/")
 def read_root():
-    return {"status": "ok", "note": "Use /train, /predict, /recommendations, /chat endpoints"}
+    return {"status": "ok", "note": "Use /train, /predict, /predict_batch, /recommendations, /chat endpoints"}
 
-@app.post("/train", response_model=TrainResponse)
-def train_model_endpoint(test_size: float = 0.2):
+# --------------------------
+# Background training: one fit at a time, off the request thread
+# --------------------------
+_TRAIN_EXECUTOR = ThreadPoolExecutor(max_workers=1)
+
+def _do_train(test_size: float) -> Dict[str, Any]:
+    # one trainer across all uvicorn workers: the others would race on the artifact files
+    with file_lock(TRAIN_LOCK_PATH, exclusive=True) as acquired:
+        if not acquired:
+            raise RuntimeError("Another worker is already training the model.")
+        return _train_and_save(test_size)
+
+def _train_and_save(test_size: float) -> Dict[str, Any]:
     """
     Train the model from CSV and save the model + preprocessing pipeline.
     Returns train and validation MAE.
     """
-    global model, preprocessor, feature_columns
+    global _SERVING
 
     # Load data
-    try:
-        df = load_csv(CSV_PATH)
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+    df = load_csv(CSV_PATH)
 
     if TARGET_COL not in df.columns:
-        raise HTTPException(status_code=400, detail=f"Target column '{TARGET_COL}' not found in CSV.")
+        raise ValueError(f"Target column '{TARGET_COL}' not found in CSV.")
 
     # Drop rows with missing target
     df = df.dropna(subset=[TARGET_COL]).reset_index(drop=True)
 
-    # Create pipeline
-    preprocessor, feature_columns, num_cols, cat_cols = create_preprocessing_pipeline(df, TARGET_COL)
+    # Create pipeline (kept local until training succeeds so /predict never sees it unfitted)
+    prep, feat_cols, num_cols, cat_cols = create_preprocessing_pipeline(df, TARGET_COL)
 
-    X = df[feature_columns].copy()
+    X = df[feat_cols].copy()
     y = df[TARGET_COL].astype(float)
 
     # Split
     X_train, X_val, y_train, y_val = train_test_split(X, y, test_size=test_size, random_state=RANDOM_STATE)
 
-    # Fit preprocessor on training data
-    X_train_trans = preprocessor.fit_transform(X_train)
-    X_val_trans = preprocessor.transform(X_val)
+    # Fit preprocessor on training data. No dtype cast: HistGradientBoosting validates X as
+    # float64 in fit and predict anyway, so a float32 copy would only be converted straight back
+    X_train_trans = prep.fit_transform(X_train)
+    X_val_trans = prep.transform(X_val)
 
-    # Train model
-    mdl = RandomForestRegressor(n_estimators=200, random_state=RANDOM_STATE)
+    # Train model: shallow trees keep each traversal short and the compiled/ONNX model small
+    mdl = HistGradientBoostingRegressor(
+        max_iter=COMPACT_MAX_ITER,
+        learning_rate=0.05,
+        max_depth=6,
+        max_leaf_nodes=31,
+        min_samples_leaf=20,
+        early_stopping=True,
+        validation_fraction=0.1,
+        warm_start=True,
+        random_state=RANDOM_STATE,
+    )
     mdl.fit(X_train_trans, y_train)
+    val_mae = float(mean_absolute_error(y_val, mdl.predict(X_val_trans)))
+
+    # grow the ensemble only if early stopping didn't already cut it short, and keep the
+    # bigger model only when it pays for its extra latency
+    if mdl.n_iter_ >= COMPACT_MAX_ITER:
+        compact, compact_mae = copy.deepcopy(mdl), val_mae
+        mdl.set_params(max_iter=MAX_ITER)
+        mdl.fit(X_train_trans, y_train)
+        val_mae = float(mean_absolute_error(y_val, mdl.predict(X_val_trans)))
+        if val_mae > compact_mae * (1.0 - MIN_MAE_GAIN):
+            mdl, val_mae = compact, compact_mae
 
-    # Evaluate
-    train_pred = mdl.predict(X_train_trans)
-    val_pred = mdl.predict(X_val_trans)
-    train_mae = float(mean_absolute_error(y_train, train_pred))
-    val_mae = float(mean_absolute_error(y_val, val_pred))
+    # Evaluate. Train MAE is only a fit diagnostic, so (like HistGradientBoosting's own train
+    # scoring) estimate it on a bounded subsample instead of a full predict over X_train
+    if X_train_trans.shape[0] > TRAIN_MAE_SAMPLES:
+        idx = np.random.RandomState(RANDOM_STATE).choice(X_train_trans.shape[0], TRAIN_MAE_SAMPLES, replace=False)
+        X_score, y_score = X_train_trans[idx], y_train.iloc[idx]
+    else:
+        X_score, y_score = X_train_trans, y_train
+    train_pred = mdl.predict(X_score)
+    train_mae = float(mean_absolute_error(y_score, train_pred))
+
+    encoder = build_row_encoder(prep)
+    # other workers may be mid-reload (holding the lock shared); wait for them, then keep them
+    # out until the whole artifact set is consistent again
+    with file_lock(ARTIFACT_LOCK_PATH, exclusive=True, blocking=True):
+        # Save model
+        atomic_dump(mdl, MODEL_PATH)
 
-    # Save model and preprocessor + store feature_columns in a wrapper dict
-    joblib.dump(mdl, MODEL_PATH)
-    # To be able to reconstruct later we save a dict containing pipeline and feature list
-    pipeline_wrapper = {"preprocessor": preprocessor, "feature_columns": feature_columns}
-    joblib.dump(pipeline_wrapper, PIPELINE_PATH)
+        predictor = None
+        try:
+            predictor = compile_model(mdl, COMPILED_MODEL_PATH)
+        except Exception as e:
+            print("Warning: model compilation failed:", e)
+        # fused ONNX graph of preprocessor + model for serving when there is no compiled library
+        # (which always wins, so exporting both would be wasted work); the .pkl is still kept
+        # for retraining/fallback
+        fused = None
+        if predictor is None:
+            try:
+                if export_onnx_model(prep, mdl, ONNX_MODEL_PATH):
+                    candidate = load_onnx_model(ONNX_MODEL_PATH, prep)
+                    if candidate is not None:
+                        check_onnx_model(candidate, prep, mdl, X_val.head(ONNX_CHECK_ROWS))
+                    fused = candidate
+            except Exception as e:
+                print("Warning: ONNX export failed, using sklearn predict:", e)
+        # don't let a later startup pick up artifacts built from a previous model
+        for path, artifact in ((ONNX_MODEL_PATH, fused), (COMPILED_MODEL_PATH, predictor)):
+            if artifact is None and os.path.exists(path):
+                os.remove(path)
 
-    # set global variables
-    model = mdl
-    preprocessor = preprocessor
-    # feature_columns already set
+        # Save preprocessor + feature_columns in a wrapper dict. This goes last: other workers
+        # reload when its mtime changes, by which point every other artifact is in place
+        pipeline_wrapper = {"preprocessor": prep, "feature_columns": feat_cols}
+        atomic_dump(pipeline_wrapper, PIPELINE_PATH)
+
+    # swap in the new model for this worker
+    with _TRAIN_LOCK:
+        _SERVING = ServingModel(mdl, prep, feat_cols, fused, predictor, encoder, os.path.getmtime(PIPELINE_PATH))
 
     return {"message": "Model trained and saved.", "train_mae": train_mae, "val_mae": val_mae}
 
-@app.post("/predict", response_model=PredictResponse)
-def predict(request: PredictRequest):
+def _job_path(job_id: str) -> str:
+    return os.path.join(TRAIN_JOBS_DIR, f"{job_id}.json")
+
+def _write_job_status(job_id: str, status: str, **fields) -> Dict[str, Any]:
+    # written atomically, so a worker answering /train/status never reads half a file
+    job = {"job_id": job_id, "status": status, **fields}
+    os.makedirs(TRAIN_JOBS_DIR, exist_ok=True)
+    atomic_write(json.dumps(job).encode("utf-8"), _job_path(job_id))
+    return job
+
+def _read_job_status(job_id: str) -> Optional[Dict[str, Any]]:
+    # job ids are uuid hex; anything else can't name a status file
+    if not job_id.isalnum():
+        return None
+    try:
+        with open(_job_path(job_id), encoding="utf-8") as f:
+            job = json.load(f)
+            age = time.time() - os.fstat(f.fileno()).st_mtime
+    except (OSError, ValueError):
+        return None
+    if job.get("status") in ("pending", "running") and age > TRAIN_JOB_STALE_AFTER:
+        # the worker that owned it restarted or crashed, so it will never finish; reporting
+        # it as failed also lets _prune_train_jobs remove it
+        job = {**job, "status": "failed", "message": "Training job was abandoned before it finished."}
+    return job
+
+def _run_train_job(job_id: str, test_size: float) -> None:
+    _write_job_status(job_id, "running")
+    try:
+        result = _do_train(test_size)
+    except Exception as e:
+        _write_job_status(job_id, "failed", message=str(e))
+    else:
+        _write_job_status(job_id, "completed", **result)
+
+def _prune_train_jobs() -> None:
+    # forget the oldest finished jobs once there are more than MAX_TRAIN_JOBS status files
+    # (temp files from atomic_write are hidden, so they are never picked up here)
+    try:
+        names = [n for n in os.listdir(TRAIN_JOBS_DIR) if n.endswith(".json") and not n.startswith(".")]
+    except OSError:
+        return
+    paths = [os.path.join(TRAIN_JOBS_DIR, n) for n in names]
+    try:
+        paths.sort(key=os.path.getmtime)
+    except OSError:
+        return  # another worker pruned concurrently; try again on the next /train
+    excess = len(paths) - MAX_TRAIN_JOBS
+    for path in paths:
+        if excess <= 0:
+            break
+        job = _read_job_status(os.path.basename(path)[:-len(".json")])
+        if job is not None and job["status"] in ("pending", "running"):
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        excess -= 1
+
+@app.post("/train", response_model=TrainJobResponse)
+def train_model_endpoint(test_size: float = 0.2):
     """
-    Predict 5yr_Return for a single sample. Expects features matching training feature names.
-    Example body:
-    { "features": {"Risk_Level": "Medium", "Expense_Ratio": 0.2, "AUM_millions": 150} }
+    Queue a training run from CSV and return immediately with a job id.
+    Poll /train/status/{job_id} for the train and validation MAE.
     """
-    global model, preprocessor, feature_columns
-    if model is None or not os.path.exists(MODEL_PATH):
-        raise HTTPException(status_code=400, detail="Model not available. Call /train first.")
+    if not 0.0 < test_size < 1.0:
+        raise HTTPException(status_code=400, detail="test_size must be between 0 and 1.")
+    job_id = uuid.uuid4().hex
+    # the status file exists before the job can run, so any worker can be polled right away
+    job = _write_job_status(job_id, "pending")
+    _TRAIN_EXECUTOR.submit(_run_train_job, job_id, test_size)
+    _prune_train_jobs()
+    return job
 
-    # load wrapper pipeline to get preprocessor & feature list if globals missing
-    if preprocessor is None:
-        wrapper = joblib.load(PIPELINE_PATH)
-        preprocessor = wrapper["preprocessor"]
-        feature_columns = wrapper.get("feature_columns", None)
+@app.get("/train/status/{job_id}", response_model=TrainStatusResponse)
+def train_status(job_id: str):
+    job = _read_job_status(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown training job '{job_id}'")
+    return job
 
-    # build DataFrame with a single row
-    input_features = request.features or {}
-    if feature_columns:
+def _features_frame(serving: ServingModel, features_list: List[Dict[str, Any]]) -> pd.DataFrame:
+    # slow path for pipelines RowEncoder doesn't understand: the DataFrame transform() expects
+    if serving.feature_columns:
         # ensure all expected columns are present (fill missing with NaN)
-        X_new = pd.DataFrame([{col: input_features.get(col, pd.NA) for col in feature_columns}])
+        X_new = pd.DataFrame([{col: f.get(col, np.nan) for col in serving.feature_columns} for f in features_list],
+                             columns=serving.feature_columns)
+    else:
+        X_new = pd.DataFrame(features_list)
+    # a categorical column no sample sent comes out float64, which the constant (string)
+    # imputer rejects; keep those object like in training
+    columns = onnx_input_columns(serving.preprocessor)
+    if columns is not None:
+        cat_cols = [c for c in columns[1] if c in X_new.columns]
+        X_new[cat_cols] = X_new[cat_cols].astype(object)
+    return X_new
+
+def _predict_core(features: Dict[str, Any]) -> Optional[float]:
+    """
+    Predict 5yr_Return for one feature dict. Returns None if no model is available;
+    errors while encoding/predicting the row are raised to the caller.
+    """
+    serving = current_model()
+    if serving is None:
+        return None
+
+    if serving.compiled_model is None and serving.onnx_model is not None:
+        # raw values straight into the fused graph: no encoding step at all
+        return float(serving.onnx_model.predict([features])[0])
+
+    if serving.row_encoder is not None:
+        # hot path: write the row directly, skipping DataFrame construction + transform
+        X_new_trans = serving.row_encoder.encode(features)
+    else:
+        X_new_trans = serving.preprocessor.transform(_features_frame(serving, [features]))
+    return float(predict_rows(serving, X_new_trans)[0])
+
+def _predict_batch_core(features_list: List[Dict[str, Any]]) -> Optional[np.ndarray]:
+    """
+    Predict 5yr_Return for many feature dicts with one encode and one model call.
+    Returns None if no model is available.
+    """
+    serving = current_model()
+    if serving is None:
+        return None
+    if not features_list:
+        return np.empty(0)
+    if serving.compiled_model is None and serving.onnx_model is not None:
+        return serving.onnx_model.predict(features_list).astype(float)
+    # one matrix for the whole batch, encoded exactly like the single-row path
+    if serving.row_encoder is not None:
+        X_new_trans = serving.row_encoder.encode_many(features_list)
     else:
-        X_new = pd.DataFrame([input_features])
+        X_new_trans = serving.preprocessor.transform(_features_frame(serving, features_list))
+    return predict_rows(serving, X_new_trans).astype(float)
+
+def _predict_many(features_list: List[Dict[str, Any]]) -> List[Any]:
+    # a lone request keeps the single-row fast path; a failing batch is retried per row so
+    # one bad input only fails its own request. Items are a float, None or the exception.
+    if len(features_list) > 1:
+        try:
+            preds = _predict_batch_core(features_list)
+            return [None] * len(features_list) if preds is None else preds.tolist()
+        except Exception:
+            pass
+    results = []
+    for features in features_list:
+        try:
+            results.append(_predict_core(features))
+        except Exception as e:
+            results.append(e)
+    return results
 
-    # transform and predict
+class PredictCoalescer:
+    """
+    Collects /predict calls that arrive within `window` seconds of each other and runs them
+    as a single batched predict in a worker thread, then hands each caller its own result.
+    """
+    def __init__(self, window: float, max_batch: int):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def submit(self, features: Dict[str, Any]) -> Optional[float]:
+        if self._task is None or self._task.done():
+            # created lazily so the queue and task belong to the worker's running loop
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((features, future))
+        return await future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self._queue.get()]
+            await asyncio.sleep(self.window)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                results = await loop.run_in_executor(None, _predict_many, [f for f, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, future), result in zip(batch, results):
+                if future.done():  # caller went away
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+_PREDICT_COALESCER = PredictCoalescer(PREDICT_COALESCE_WINDOW, PREDICT_MAX_BATCH)
+
+@app.post("/predict", response_model=PredictResponse)
+async def predict(request: PredictRequest):
+    """
+    Predict 5yr_Return for a single sample. Expects features matching training feature names.
+    Concurrent calls are transparently batched into one model call.
+    Example body:
+    { "features": {"Risk_Level": "Medium", "Expense_Ratio": 0.2, "AUM_millions": 150} }
+    """
     try:
-        X_new_trans = preprocessor.transform(X_new)
-        pred = model.predict(X_new_trans)[0]
-        return {"predicted_5yr_return": float(pred)}
+        pred = await _PREDICT_COALESCER.submit(request.features or {})
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Prediction failed: {e}")
+    if pred is None:
+        raise HTTPException(status_code=400, detail="Model not available. Call /train first.")
+    return {"predicted_5yr_return": pred}
 
-@app.post("/recommendations", response_model=RecommendationsResponse)
-def recommendations(risk: str):
+@app.post("/predict_batch", response_model=PredictBatchResponse)
+def predict_batch(request: PredictBatchRequest):
     """
-    Return top 3 investments from CSV for the given risk profile.
+    Predict 5yr_Return for several samples in one call.
+    Example body:
+    { "features": [{"Risk_Level": "Medium", "Expense_Ratio": 0.2}, {"Risk_Level": "High"}] }
     """
-    # Load CSV
     try:
-        df = load_csv(CSV_PATH)
-    except FileNotFoundError as e:
-        raise HTTPException(status_code=400, detail=str(e))
+        preds = _predict_batch_core(request.features)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Prediction failed: {e}")
+    if preds is None:
+        raise HTTPException(status_code=400, detail="Model not available. Call /train first.")
+    return {"predicted_5yr_returns": preds.tolist()}
 
-    risk_norm = risk.strip().lower()
+def _recommendations_unavailable(cache: Optional[CsvCache]) -> Optional[str]:
+    # reason the CSV can't serve recommendations at all, or None if it can
+    if cache is None:
+        return f"CSV file '{CSV_PATH}' not found. Put it in the project directory."
+    if cache.risk_codes is None:
+        return "CSV is missing 'Risk_Level' column required for filtering."
+    return None
 
-    if "Risk_Level" not in df.columns:
-        raise HTTPException(status_code=400, detail="CSV is missing 'Risk_Level' column required for filtering.")
+def _recommend_core(cache: Optional[CsvCache], risk: str) -> Optional[List[dict]]:
+    """
+    Top 3 investments for the given risk profile, or None if nothing matches
+    (see _recommendations_unavailable() for why, when the CSV itself is unusable).
+    """
+    if _recommendations_unavailable(cache) is not None:
+        return None
+
+    risk_norm = risk.strip().lower()
 
-    candidates = df[df["Risk_Level"].str.strip().str.lower() == risk_norm]
-    if candidates.empty:
+    response_items = cache.top_by_risk.get(risk_norm)
+    if response_items is None:
+        response_items = cache.top_by_contains.get(risk_norm)
+    if response_items is None:
         # relaxed matching: check if risk string appears in column values
-        candidates = df[df["Risk_Level"].str.strip().str.lower().str.contains(risk_norm, na=False)]
+        codes = [code for name, code in cache.risk_code_map.items() if risk_norm in name]
+        if not codes:
+            # unknown risk: decided from the few category names, without touching the rows
+            return None
+        candidates = cache.df[np.isin(cache.risk_codes, codes)]
+        # cache is already sorted by return column (if it exists)
+        response_items = top_items(candidates)
+        cache.top_by_contains[risk_norm] = response_items
+    return response_items
 
-    if candidates.empty:
+@app.post("/recommendations", response_model=RecommendationsResponse)
+def recommendations(risk: str):
+    """
+    Return top 3 investments from CSV for the given risk profile.
+    """
+    cache = refresh_csv_cache()
+    response_items = _recommend_core(cache, risk)
+    if response_items is None:
+        reason = _recommendations_unavailable(cache)
+        if reason is not None:
+            raise HTTPException(status_code=400, detail=reason)
         raise HTTPException(status_code=404, detail=f"No investments found for risk '{risk}'")
-
-    # sort by return column if exists
-    if TARGET_COL in candidates.columns:
-        top = candidates.sort_values(by=TARGET_COL, ascending=False).head(3)
-    else:
-        top = candidates.head(3)
-
-    response_items = []
-    for _, r in top.iterrows():
-        response_items.append({
-            "Investment_Name": r.get("Investment_Name", "Unknown"),
-            "Risk_Level": r.get("Risk_Level"),
-            "FiveYearReturn": r.get(TARGET_COL) if TARGET_COL in r.index else None
-        })
     return {"risk": risk, "top_options": response_items}
 
 @app.post("/chat")
@@ -264,22 +1090,27 @@ def chat_endpoint(req: ChatRequest):
     parts = []
     # 1) CSV recs if risk given
     if req.risk:
-        try:
-            recs_resp = recommendations(req.risk)
-            recs = recs_resp["top_options"]
+        cache = refresh_csv_cache()
+        recs = _recommend_core(cache, req.risk)
+        if recs is not None:
             parts.append(f"Based on a {req.risk} risk profile, top picks are:")
             for item in recs:
                 parts.append(f"- {item['Investment_Name']} ({item.get('FiveYearReturn', 'N/A')}% 5yr)")
-        except HTTPException as e:
-            parts.append(f"Couldn't find CSV recommendations: {e.detail}")
+        else:
+            reason = _recommendations_unavailable(cache) or f"No investments found for risk '{req.risk}'"
+            parts.append(f"Couldn't find CSV recommendations: {reason}")
 
     # 2) model prediction if features are provided
     if req.features:
         try:
-            pred = predict(PredictRequest(features=req.features))
-            parts.append(f"Model predicts a {pred['predicted_5yr_return']:.2f}% 5-year return for the provided inputs.")
-        except HTTPException as e:
-            parts.append(f"Prediction unavailable: {e.detail}")
+            pred = _predict_core(req.features)
+        except Exception as e:
+            parts.append(f"Prediction unavailable: Prediction failed: {e}")
+        else:
+            if pred is None:
+                parts.append("Prediction unavailable: Model not available. Call /train first.")
+            else:
+                parts.append(f"Model predicts a {pred:.2f}% 5-year return for the provided inputs.")
 
     # 3) If nothing provided, reply with a help message
     if not parts:
@@ -289,3 +1120,10 @@ def chat_endpoint(req: ChatRequest):
                      '{"message":"...","risk":"Medium","features":{"Risk_Level":"Medium","Expense_Ratio":0.25}}')
 
     return {"response": "\n".join(parts)}
+
+if __name__ == "__main__":
+    import uvicorn
+    # one process per core (override with WEB_CONCURRENCY); each worker loads its own model
+    # and ONNX session, so inference is lock-free and not bound by a single GIL
+    uvicorn.run("main:app", host="127.0.0.1", port=8000,
+                workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)))